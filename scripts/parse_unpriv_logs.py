@@ -4,13 +4,23 @@
 from __future__ import annotations
 
 import json
+import mmap
+import os
 import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 TIMESTAMP_RE = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?Z\s*")
-TEST_MARKERS = ("✓", "✗", "⊝")
+TEST_MARKERS = frozenset(("✓", "✗", "⊝"))
+STATUS_MAP = {"✓": "passed", "✗": "failed", "⊝": "skipped"}
 SECTION_PREFIXES = (
     "Test Results for",
     "Detailed Results:",
@@ -24,66 +34,151 @@ SECTION_PREFIXES = (
     "Using container runtime",
     "Found container",
 )
+CONTEXT_SKIP_PREFIXES = (
+    "[command]",
+    "Post job cleanup",
+    "Temporary overriding",
+    "Adding repository directory",
+    "Cleaning up",
+    "shell:",
+    "env:",
+)
 FAILURE_KEYWORDS = ("error", "failed", "exception", "traceback", "abort", "denied")
+FAILURE_KEYWORDS_RE = re.compile("|".join(re.escape(keyword) for keyword in FAILURE_KEYWORDS), re.IGNORECASE)
+ENV_KEYS = ("RECIPE", "VERSION")
+ENV_PREFIXES = tuple(f"{key}:" for key in ENV_KEYS)
 LOG_ROOT = Path("local/unpriv_logs")
 OUTPUT_PATH = Path("unpriv_build_summary.json")
 MAX_OUTPUT_CHARS = 4000
+MIN_PARALLEL_LOGS = 4
 
 
 def strip_timestamp(line: str) -> str:
-    """Remove the leading GitHub Actions timestamp if present."""
-    line = line.replace("\ufeff", "")
+    """Remove the leading GitHub Actions timestamp and trailing whitespace.
+
+    Whitespace after a timestamp is dropped along with it; lines without a
+    timestamp keep their indentation.
+    """
+    # Concatenated step logs can carry a BOM anywhere in the line, including
+    # after the timestamp where str.strip() would not remove it.
+    if "\ufeff" in line:
+        line = line.replace("\ufeff", "")
+    if not line[:1].isdigit():
+        return line.rstrip()
+    # Fast path for the fixed-shape YYYY-MM-DDTHH:MM:SS[.frac]Z prefix.
+    if (
+        len(line) > 20
+        and line[4] == "-"
+        and line[7] == "-"
+        and line[10] == "T"
+        and line[13] == ":"
+        and line[16] == ":"
+    ):
+        if line[19] == "Z":
+            return line[20:].strip()
+        if line[19] == ".":
+            z = line.find("Z", 21, 30)
+            if z > 0 and line[20:z].isdigit():
+                return line[z + 1 :].strip()
     return TIMESTAMP_RE.sub("", line, count=1).rstrip()
 
 
-def clamp_text(text: str, limit: int = MAX_OUTPUT_CHARS) -> str:
-    """Clamp large output blobs to a manageable length."""
-    if len(text) <= limit:
-        return text
-    truncated = text[:limit].rstrip()
-    remainder = len(text) - limit
-    return f"{truncated}\n... (truncated, {remainder} more characters)"
-
-
-def iter_log_files(root: Path) -> List[Path]:
-    """Return a sorted list of log files to process."""
+def clamp_join(parts: Iterable[str], sep: str = "\n", limit: int = MAX_OUTPUT_CHARS) -> Tuple[str, int]:
+    """Join parts, stopping as soon as the result would exceed the limit.
+
+    Leading and trailing empty parts are dropped before measuring, matching a
+    strip() of the joined text. Returns the joined text and the number of
+    parts consumed; once the limit is hit the rest of parts is left unread.
+    """
+    buf: List[str] = []
+    size = 0
+    pending = 0
+    consumed = 0
+    for part in parts:
+        consumed += 1
+        if not part:
+            # Empty parts only count once a non-empty part follows them.
+            if buf:
+                pending += 1
+            continue
+        added = len(part) + (len(sep) * (pending + 1) if buf else 0)
+        if size + added > limit:
+            keep = limit - size - (added - len(part))
+            if keep > 0:
+                buf.extend([""] * pending)
+                buf.append(part[:keep])
+            return f"{sep.join(buf).strip()}\n... (truncated)", consumed
+        buf.extend([""] * pending)
+        buf.append(part)
+        size += added
+        pending = 0
+    return sep.join(buf).strip(), consumed
+
+
+def iter_log_files(root: Path) -> List[str]:
+    """Return log files to process, ordered by build name (file stem) then path."""
     if not root.exists():
         return []
-    files: List[Path] = []
-    for path in root.rglob("*.txt"):
-        if path.name.lower() == "system.txt":
-            continue
-        if path.is_file():
-            files.append(path)
-    return sorted(files)
+    files: List[Tuple[str, str]] = []
+    stack = [os.fspath(root)]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif (
+                    entry.is_file()
+                    and entry.name.endswith(".txt")
+                    and entry.name.lower() != "system.txt"
+                ):
+                    files.append((os.path.splitext(entry.name)[0], entry.path))
+    files.sort()
+    return [path for _, path in files]
+
+
+def index_messages(
+    messages: Sequence[str],
+) -> Tuple[Dict[str, str], Optional[str], List[int], Optional[int]]:
+    """Collect env values, the detected version and section indices in one pass."""
+    envs: Dict[str, str] = {}
+    detected_version: Optional[str] = None
+    error_indices: List[int] = []
+    test_results_idx: Optional[int] = None
+    for idx, msg in enumerate(messages):
+        if msg.startswith("##[error]"):
+            error_indices.append(idx)
+        elif msg.startswith(ENV_PREFIXES):
+            key, value = msg.split(":", 1)
+            envs.setdefault(key, value.strip())
+        elif msg.startswith("Detected version:"):
+            if detected_version is None:
+                detected_version = msg.split(":", 1)[1].strip()
+        elif msg.lstrip().startswith("Test Results for"):
+            test_results_idx = idx
+    return envs, detected_version, error_indices, test_results_idx
 
 
-def extract_env_value(messages: Sequence[str], prefix: str) -> Optional[str]:
-    target = f"{prefix}:"
-    for msg in messages:
-        if msg.startswith(target):
-            return msg.split(":", 1)[1].strip()
-    return None
+def iter_test_output(messages: Sequence[str], start: int) -> Iterator[str]:
+    """Yield a failed test's output lines up to the next test or section."""
+    for idx in range(start, len(messages)):
+        msg = messages[idx].lstrip()
+        if msg and (msg.startswith(SECTION_PREFIXES) or msg[0] in TEST_MARKERS):
+            return
+        yield msg
 
 
-def parse_test_blocks(messages: Sequence[str]) -> Dict[str, Any]:
-    last_idx: Optional[int] = None
-    for idx, raw_msg in enumerate(messages):
-        if raw_msg.lstrip().startswith("Test Results for"):
-            last_idx = idx
+def parse_test_blocks(messages: Sequence[str], last_idx: Optional[int]) -> Dict[str, Any]:
     if last_idx is None:
         return {}
 
-    container_line = messages[last_idx].lstrip()
-    container = container_line[len("Test Results for") :].strip().rstrip(":")
+    container = messages[last_idx].lstrip()[len("Test Results for") :].strip().rstrip(":")
     summary: Dict[str, Any] = {}
     tests: List[Dict[str, Any]] = []
     failures: List[Dict[str, Any]] = []
 
     idx = last_idx + 1
     while idx < len(messages):
-        raw_msg = messages[idx]
-        msg = raw_msg.lstrip()
+        msg = messages[idx].lstrip()
         if not msg:
             idx += 1
             continue
@@ -103,8 +198,7 @@ def parse_test_blocks(messages: Sequence[str]) -> Dict[str, Any]:
         idx += 1
 
     while idx < len(messages):
-        raw_msg = messages[idx]
-        msg = raw_msg.lstrip()
+        msg = messages[idx].lstrip()
         if not msg:
             idx += 1
             continue
@@ -119,29 +213,18 @@ def parse_test_blocks(messages: Sequence[str]) -> Dict[str, Any]:
                 name_part, status_part = rest.split(": ", 1)
                 name = name_part.strip()
                 note = status_part.strip()
-            status_map = {"✓": "passed", "✗": "failed", "⊝": "skipped"}
-            status = status_map.get(first, "unknown")
+            status = STATUS_MAP.get(first, "unknown")
             record: Dict[str, Any] = {"name": name, "status": status}
             if note and note.lower() != status:
                 record["note"] = note
 
             if status == "failed":
-                output_lines: List[str] = []
-                lookahead = idx + 1
-                while lookahead < len(messages):
-                    nxt_raw = messages[lookahead]
-                    nxt = nxt_raw.lstrip()
-                    if not nxt:
-                        output_lines.append("")
-                        lookahead += 1
-                        continue
-                    if nxt.startswith(SECTION_PREFIXES) or (nxt and nxt[0] in TEST_MARKERS):
-                        break
-                    output_lines.append(nxt)
-                    lookahead += 1
-                if output_lines:
-                    record["output"] = clamp_text("\n".join(output_lines).strip())
-                idx = lookahead - 1
+                output, consumed = clamp_join(iter_test_output(messages, idx + 1))
+                if consumed:
+                    record["output"] = output
+                # When the output was truncated, the outer loop skips the
+                # unread remainder since none of it starts a test or section.
+                idx += consumed
                 failures.append(record)
             tests.append(record)
         idx += 1
@@ -167,48 +250,89 @@ def collect_failure_context(messages: Sequence[str], error_indices: Sequence[int
         msg
         for msg in messages[start:idx]
         if msg
-        and not msg.startswith(("[command]", "Post job cleanup", "Temporary overriding", "Adding repository directory", "Cleaning up", "shell:", "env:"))
+        and not msg.startswith(CONTEXT_SKIP_PREFIXES)
     ]
     if not context:
         return {}
 
     trimmed_context = context[-20:]
     reason = next(
-        (line for line in reversed(trimmed_context) if any(keyword in line.lower() for keyword in FAILURE_KEYWORDS)),
+        (line for line in reversed(trimmed_context) if FAILURE_KEYWORDS_RE.search(line)),
         trimmed_context[-1],
     )
-    output = clamp_text("\n".join(trimmed_context).strip())
+    output, _ = clamp_join(trimmed_context)
     return {"reason": reason, "output": output}
 
 
-def parse_log(path: Path) -> Dict[str, Any]:
-    text = path.read_text(encoding="utf-8-sig", errors="replace")
-    lines = text.splitlines()
-    messages = [strip_timestamp(line) for line in lines]
+def find_message_value(buf: mmap.mmap, prefix: str) -> Optional[str]:
+    """Return the value of the first message starting with prefix, if any."""
+    needle = prefix.encode()
+    pos = buf.find(needle)
+    while pos != -1:
+        # Text-mode reads split on both "\n" and a bare "\r"; bound the line
+        # the same way so this path sees the messages the full parse does.
+        start = max(buf.rfind(b"\n", 0, pos), buf.rfind(b"\r", 0, pos)) + 1
+        ends = [end for end in (buf.find(b"\n", pos), buf.find(b"\r", pos)) if end != -1]
+        end = min(ends) if ends else len(buf)
+        msg = strip_timestamp(buf[start:end].decode("utf-8", errors="replace"))
+        if msg.startswith(prefix):
+            return msg.split(":", 1)[1].strip()
+        pos = buf.find(needle, end)
+    return None
+
+
+def probe_simple_log(path: str) -> Optional[Tuple[Dict[str, str], Optional[str]]]:
+    """Return (env values, detected version) for logs with no errors or test results.
+
+    Returns None when the log needs the full line-by-line parse.
+    """
+    with open(path, "rb") as handle:
+        try:
+            buf = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped.
+            return None
+        with buf:
+            if buf.find(b"##[error]") != -1 or buf.find(b"Test Results for") != -1:
+                return None
+            envs: Dict[str, str] = {}
+            for prefix in ENV_PREFIXES:
+                value = find_message_value(buf, prefix)
+                if value is not None:
+                    envs[prefix[:-1]] = value
+            return envs, find_message_value(buf, "Detected version:")
+
+
+def parse_log(path: str) -> Dict[str, Any]:
+    probe = probe_simple_log(path)
+    if probe is not None:
+        messages: List[str] = []
+        envs, detected_version = probe
+        error_indices: List[int] = []
+        test_results_idx: Optional[int] = None
+    else:
+        with open(path, "r", encoding="utf-8-sig", errors="replace") as handle:
+            messages = [strip_timestamp(line) for line in handle]
+        envs, detected_version, error_indices, test_results_idx = index_messages(messages)
 
     entry: Dict[str, Any] = {
-        "name": path.stem,
-        "path": str(path),
+        "name": os.path.splitext(os.path.basename(path))[0],
+        "path": path,
     }
 
-    recipe = extract_env_value(messages, "RECIPE")
+    recipe = envs.get("RECIPE")
     if recipe:
         entry["recipe"] = recipe
-    version = None
-    for msg in messages:
-        if msg.startswith("Detected version:"):
-            version = msg.split(":", 1)[1].strip()
-            break
+    version = detected_version
     if not version:
-        version = extract_env_value(messages, "VERSION")
+        version = envs.get("VERSION")
     if version:
         entry["version"] = version
 
-    error_indices = [idx for idx, msg in enumerate(messages) if msg.startswith("##[error]")]
     status = "failed" if error_indices else "succeeded"
     entry["status"] = status
 
-    test_info = parse_test_blocks(messages)
+    test_info = parse_test_blocks(messages, test_results_idx)
     if test_info:
         entry.update(test_info)
 
@@ -230,10 +354,16 @@ def parse_log(path: Path) -> Dict[str, Any]:
     else:
         failures: List[Dict[str, Any]] = test_info.get("failures", []) if test_info else []
         if failures:
-            entry["reason"] = "Tests failed: " + ", ".join(failure["name"] for failure in failures)
-            outputs = [failure.get("output") for failure in failures if failure.get("output")]
+            names: List[str] = []
+            outputs: List[str] = []
+            for failure in failures:
+                names.append(failure["name"])
+                output = failure.get("output")
+                if output:
+                    outputs.append(output)
+            entry["reason"] = "Tests failed: " + ", ".join(names)
             if outputs:
-                entry["failure_output"] = clamp_text("\n\n".join(outputs))
+                entry["failure_output"], _ = clamp_join(outputs, "\n\n")
         else:
             context = collect_failure_context(messages, error_indices)
             if context:
@@ -247,20 +377,29 @@ def parse_log(path: Path) -> Dict[str, Any]:
 
 def main() -> None:
     log_files = iter_log_files(LOG_ROOT)
-    entries = [parse_log(path) for path in log_files]
-    entries.sort(key=lambda item: item.get("name", ""))
+    if len(log_files) < MIN_PARALLEL_LOGS:
+        entries = [parse_log(path) for path in log_files]
+    else:
+        workers = os.cpu_count() or 1
+        chunksize = max(1, len(log_files) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            entries = list(executor.map(parse_log, log_files, chunksize=chunksize))
 
+    status_counts = Counter(item.get("status") for item in entries)
     summary = {
         "log_directory": str(LOG_ROOT),
         "total_builds": len(entries),
         "summary": {
-            "succeeded": sum(1 for item in entries if item.get("status") == "succeeded"),
-            "failed": sum(1 for item in entries if item.get("status") == "failed"),
+            "succeeded": status_counts["succeeded"],
+            "failed": status_counts["failed"],
         },
         "entries": entries,
     }
 
-    OUTPUT_PATH.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    if orjson is not None:
+        OUTPUT_PATH.write_bytes(orjson.dumps(summary, option=orjson.OPT_INDENT_2))
+    else:
+        OUTPUT_PATH.write_text(json.dumps(summary, indent=2), encoding="utf-8")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,45 @@
+"""Tests for parse_unpriv_logs."""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import parse_unpriv_logs
+
+
+TS = b"2024-01-01T10:00:00.1234567Z "
+
+
+class ProbeParityTest(unittest.TestCase):
+    """The mmap fast path must extract the same entry as the full parse."""
+
+    CASES = {
+        "plain": TS + b"RECIPE: fsl\n" + TS + b"VERSION: 6.0\n",
+        "bare_cr": TS + b"downloading 10%\r" + TS + b"RECIPE: fsl\n",
+        "crlf": TS + b"RECIPE: fsl\r\n" + TS + b"Detected version: 6.0.7\r\n",
+        "mid_line_prefix": TS + b"echo RECIPE: nope\n" + TS + b"  RECIPE: fsl\n",
+        "indented_untimestamped": b"  RECIPE: nope\nRECIPE: fsl\n",
+        "bom": b"\xef\xbb\xbf" + TS + b"RECIPE: fsl\n" + TS + b"\xef\xbb\xbfVERSION: 6.0\n",
+        "empty_detected_version": TS + b"Detected version: \n" + TS + b"VERSION: 6.0\n",
+        "no_trailing_newline": TS + b"RECIPE: fsl",
+    }
+
+    def test_fast_path_matches_full_parse(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, data in self.CASES.items():
+                with self.subTest(name):
+                    path = os.path.join(tmp, f"{name}.txt")
+                    with open(path, "wb") as handle:
+                        handle.write(data)
+                    self.assertIsNotNone(parse_unpriv_logs.probe_simple_log(path))
+                    fast = parse_unpriv_logs.parse_log(path)
+                    with mock.patch.object(parse_unpriv_logs, "probe_simple_log", return_value=None):
+                        full = parse_unpriv_logs.parse_log(path)
+                    self.assertEqual(fast, full)
+
+
+if __name__ == "__main__":
+    unittest.main()